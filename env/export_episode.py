@@ -6,16 +6,22 @@ as JSON that can be loaded into the React app for live animation.
 """
 
 import json
+from functools import partial
 from pathlib import Path
 import argparse
 
 import numpy as np
 from stable_baselines3 import PPO
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from src.titration_env import WeakAcidIndicatorEnv
 
 
-def run_and_export_episode(model_path=None, deterministic=True, output_path="episode_data.json"):
+def run_and_export_episode(model_path=None, deterministic=True, output_path="episode_data.json", indent=False):
     """
     Run an episode and export trajectory data.
     
@@ -23,11 +29,13 @@ def run_and_export_episode(model_path=None, deterministic=True, output_path="epi
         model_path: Path to trained model (None for random)
         deterministic: Use deterministic policy
         output_path: Where to save JSON data
+        indent: Pretty-print the JSON (slower, larger file)
     """
     env = WeakAcidIndicatorEnv(
         max_steps=200,
         step_sizes_ml=(0.1, 0.2, 0.5, 1.0, 2.0, 3.0),
         max_burette_ml=50.0,
+        log_history=True,
     )
     
     # Load model if provided
@@ -43,7 +51,7 @@ def run_and_export_episode(model_path=None, deterministic=True, output_path="epi
         "initial_state": {
             "Vb_ml": float(env.Vb_L * 1000.0),
             "pH": float(env._get_pH()),
-            "color": env.history[0][2].tolist() if isinstance(env.history[0][2], np.ndarray) else list(env.history[0][2]),
+            "color": env.rgb_history[0].tolist(),
         },
         "target_pH": float(env.pH_target),
         "Veq_ml": float(env.Veq_L * 1000.0),
@@ -51,61 +59,97 @@ def run_and_export_episode(model_path=None, deterministic=True, output_path="epi
         "action_names": ["0.1mL", "0.2mL", "0.5mL", "1.0mL", "2.0mL", "3.0mL", "Stop"],
     }
     
+    # Per-step columns, filled by index during the rollout
+    max_steps = env.max_steps
+    Vb_col = np.empty(max_steps, dtype=np.float64)
+    pH_col = np.empty(max_steps, dtype=np.float64)
+    color_col = np.empty((max_steps, 3), dtype=np.float32)
+    action_col = np.empty(max_steps, dtype=np.int8)
+    reward_col = np.empty(max_steps, dtype=np.float64)
+    terminated_col = np.zeros(max_steps, dtype=bool)
+    truncated_col = np.zeros(max_steps, dtype=bool)
+
     step = 0
-    total_reward = 0.0
+    if model is not None:
+        predict = partial(model.predict, deterministic=deterministic)
     
     while True:
         # Get action
         if model is None:
             action = env.action_space.sample()
         else:
-            action, _ = model.predict(obs, deterministic=deterministic)
-            if isinstance(action, np.ndarray):
-                action = int(action.item())
-            else:
-                action = int(action)
+            action, _ = predict(obs)
+            action = int(np.asarray(action).reshape(-1)[0])
         
         # Step environment
         obs, reward, terminated, truncated, info = env.step(action)
         
         # Record step
-        Vb_ml, pH, rgb = env.history[-1]
-        step_data = {
-            "step": step + 1,
-            "action": int(action),
-            "action_name": trajectory["action_names"][action],
-            "Vb_ml": float(Vb_ml),
-            "pH": float(pH),
-            "color": rgb.tolist() if isinstance(rgb, np.ndarray) else list(rgb),
-            "reward": float(reward),
-            "total_reward": float(total_reward + reward),
-            "distance_to_target": float(abs(pH - env.pH_target)),
-            "V_over_Veq": float(Vb_ml / (env.Veq_L * 1000.0)),
-            "terminated": bool(terminated),
-            "truncated": bool(truncated),
-        }
-        trajectory["steps"].append(step_data)
-        
-        total_reward += reward
+        Vb_col[step] = env.Vb_history[-1]
+        pH_col[step] = env.pH_history[-1]
+        color_col[step] = env.rgb_history[-1]
+        action_col[step] = action
+        reward_col[step] = reward
+        terminated_col[step] = terminated
+        truncated_col[step] = truncated
         step += 1
         
         if terminated or truncated:
             break
+
+    # Derived columns, computed once over the whole episode
+    Vb_col, pH_col, color_col = Vb_col[:step], pH_col[:step], color_col[:step]
+    reward_col = reward_col[:step]
+    total_reward_col = np.cumsum(reward_col)
+    dist_col = np.abs(pH_col - env.pH_target)
+    V_ratio_col = Vb_col / (env.Veq_L * 1000.0)
+
+    action_names = trajectory["action_names"]
+    trajectory["steps"] = [
+        {
+            "step": i + 1,
+            "action": action,
+            "action_name": action_names[action],
+            "Vb_ml": Vb_ml,
+            "pH": pH,
+            "color": rgb,
+            "reward": reward,
+            "total_reward": total,
+            "distance_to_target": dist,
+            "V_over_Veq": V_ratio,
+            "terminated": terminated,
+            "truncated": truncated,
+        }
+        for i, (action, Vb_ml, pH, rgb, reward, total, dist, V_ratio, terminated, truncated)
+        in enumerate(zip(
+            action_col[:step].tolist(), Vb_col.tolist(), pH_col.tolist(),
+            color_col.tolist(), reward_col.tolist(), total_reward_col.tolist(),
+            dist_col.tolist(), V_ratio_col.tolist(),
+            terminated_col[:step].tolist(), truncated_col[:step].tolist(),
+        ))
+    ]
+    total_reward = float(total_reward_col[-1])
     
     # Add summary
     trajectory["summary"] = {
         "total_steps": step,
-        "final_pH": float(trajectory["steps"][-1]["pH"]),
-        "final_Vb_ml": float(trajectory["steps"][-1]["Vb_ml"]),
-        "total_reward": float(total_reward),
-        "final_distance": float(trajectory["steps"][-1]["distance_to_target"]),
-        "success": trajectory["steps"][-1]["distance_to_target"] < 0.1,
+        "final_pH": float(pH_col[-1]),
+        "final_Vb_ml": float(Vb_col[-1]),
+        "total_reward": total_reward,
+        "final_distance": float(dist_col[-1]),
+        "success": bool(dist_col[-1] < 0.1),
     }
     
-    # Export to JSON
+    # Export to JSON (orjson when available, it is much faster than json)
     output_path = Path(output_path)
-    with open(output_path, 'w') as f:
-        json.dump(trajectory, f, indent=2)
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        output_path.write_bytes(orjson.dumps(trajectory, option=option))
+    else:
+        with open(output_path, 'w') as f:
+            json.dump(trajectory, f, indent=2 if indent else None)
     
     print(f"\nEpisode exported to {output_path}")
     print(f"   Steps: {step}")
@@ -124,6 +168,7 @@ def main():
     parser.add_argument('--deterministic', action='store_true', default=True, help='Use deterministic policy')
     parser.add_argument('--no-deterministic', dest='deterministic', action='store_false', help='Use stochastic policy')
     parser.add_argument('--random', action='store_true', help='Use random policy (overrides model)')
+    parser.add_argument('--indent', action='store_true', help='Pretty-print the JSON output')
     
     args = parser.parse_args()
     
@@ -132,6 +177,7 @@ def main():
         model_path=model_path,
         deterministic=args.deterministic,
         output_path=args.output,
+        indent=args.indent,
     )
 
 
@@ -0,0 +1,52 @@
+"""
+Ahead-of-time build of the titration kernels with numba.pycc.
+
+    cd env
+    python -m src._titration_kernels_build
+
+writes the `src/titration_kernels` extension module. When it is present,
+`titration_env` calls these precompiled kernels and skips JIT compilation
+at startup; otherwise it falls back to the @njit versions. It does the same,
+with a warning, when the module's fingerprint no longer matches the kernel
+sources, so rebuild after editing them.
+"""
+
+from pathlib import Path
+
+from numba.pycc import CC
+
+from src.titration_env import (
+    _compute_pH,
+    _compute_reward,
+    _indicator_rgb,
+    _kernel_fingerprint,
+    _pH_and_rgb,
+)
+
+KERNEL_FINGERPRINT = _kernel_fingerprint()
+
+
+def kernel_fingerprint():
+    # KERNEL_FINGERPRINT is frozen into the compiled module as a constant
+    return KERNEL_FINGERPRINT
+
+
+cc = CC("titration_kernels")
+cc.output_dir = str(Path(__file__).resolve().parent)
+cc.verbose = True
+
+cc.export("compute_pH", "f8(f8, f8, f8, f8, f8, f8, f8)")(_compute_pH.py_func)
+cc.export("indicator_rgb", "void(f8, f8, f8, f4[::1])")(_indicator_rgb.py_func)
+cc.export(
+    "pH_and_rgb",
+    "f8(f8, f8, f8, f8, f8, f8, f8, f8, f8, f4[::1])",
+)(_pH_and_rgb.py_func)
+cc.export(
+    "compute_reward",
+    "Tuple((f8, f8, b1, b1))(f8, f8, f8, f8, f8, b1, i8, i8, f8, b1)",
+)(_compute_reward.py_func)
+cc.export("kernel_fingerprint", "i8()")(kernel_fingerprint)
+
+
+if __name__ == "__main__":
+    cc.compile()
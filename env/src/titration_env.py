@@ -1,30 +1,26 @@
+import hashlib
+import inspect
+import math
+import warnings
+
 import numpy as np
 import gymnasium as gym
+from numba import njit
 from gymnasium import spaces
-import matplotlib.pyplot as plt
-from matplotlib.patches import Circle
-import matplotlib
-matplotlib.use('Agg')  # Non-interactive backend for headless environments
 
 
-def compute_pH_weak_acid_titration(
-    Va_L: float,
-    Ca: float,
-    Vb_L: float,
-    Cb: float,
-    pKa: float,
-) -> float:
+KW = 1e-14  # ion product of water at 25 C
+LN10 = math.log(10.0)  # 10**x == exp(LN10 * x)
+
+
+@njit(cache=True, fastmath=True)
+def _compute_pH(Va_L, Ca, Vb_L, Cb, pKa, Ka, Kb):
     """
-    Compute pH for titration of a monoprotic weak acid HA with strong base.
+    Compiled core of `compute_pH_weak_acid_titration`.
 
-    Va_L: initial acid volume (L)
-    Ca:   acid concentration (M)
-    Vb_L: base volume added so far (L)
-    Cb:   base concentration (M)
-    pKa:  acid pKa
+    Ka = 10^-pKa and Kb = Kw/Ka are passed in precomputed, so an env with a
+    fixed acid never recomputes them per step.
     """
-    Kw = 1e-14
-    Ka = 10 ** (-pKa)
     n_HA0 = Ca * Va_L            # initial moles of HA
     n_OH = Cb * Vb_L             # moles of OH- added
     Vtot = Va_L + Vb_L
@@ -37,8 +33,8 @@ def compute_pH_weak_acid_titration(
         # Special case: no base added yet, pure weak acid
         if n_OH <= 1e-12:
             # For weak acid: [H+] = sqrt(Ka * Ca)
-            H_plus = np.sqrt(max(Ka * Ca, 1e-20))
-            pH = -np.log10(H_plus)
+            H_plus = math.sqrt(max(Ka * Ca, 1e-20))
+            pH = -math.log10(H_plus)
         else:
             # Buffer region: Henderson-Hasselbalch
             n_A = n_OH
@@ -47,14 +43,13 @@ def compute_pH_weak_acid_titration(
             n_A = max(n_A, 1e-16)
             n_HA = max(n_HA, 1e-16)
             ratio = n_A / n_HA
-            pH = pKa + np.log10(ratio)
+            pH = pKa + math.log10(ratio)
 
     # At equivalence: solution of A- only (weak base)
     elif abs(n_OH - n_HA0) <= 1e-12:
         C_A = n_HA0 / Vtot
-        Kb = Kw / Ka
-        OH = np.sqrt(max(Kb * C_A, 1e-20))
-        pOH = -np.log10(OH)
+        OH = math.sqrt(max(Kb * C_A, 1e-20))
+        pOH = -math.log10(OH)
         pH = 14.0 - pOH
 
     # After equivalence: excess strong base
@@ -62,10 +57,82 @@ def compute_pH_weak_acid_titration(
         n_excess = n_OH - n_HA0
         OH = n_excess / Vtot
         OH = max(OH, 1e-20)
-        pOH = -np.log10(OH)
+        pOH = -math.log10(OH)
         pH = 14.0 - pOH
 
-    return float(np.clip(pH, 0.0, 14.0))
+    if pH < 0.0:
+        return 0.0
+    if pH > 14.0:
+        return 14.0
+    return pH
+
+
+@njit(cache=True, fastmath=True)
+def compute_pH_weak_acid_titration(
+    Va_L: float,
+    Ca: float,
+    Vb_L: float,
+    Cb: float,
+    pKa: float,
+) -> float:
+    """
+    Compute pH for titration of a monoprotic weak acid HA with strong base.
+
+    Va_L: initial acid volume (L)
+    Ca:   acid concentration (M)
+    Vb_L: base volume added so far (L)
+    Cb:   base concentration (M)
+    pKa:  acid pKa
+
+    Compiled with Numba: called on every env step, so it sticks to
+    scalar `math` calls rather than NumPy ufuncs.
+    """
+    Ka = math.exp(-LN10 * pKa)
+    return _compute_pH(Va_L, Ca, Vb_L, Cb, pKa, Ka, KW / Ka)
+
+
+# Indicator colors: acid form (yellow), base form (blue), neutral (green)
+ACID_RGB = np.array([1.0, 1.0, 0.0], dtype=np.float32)
+BASE_RGB = np.array([0.0, 0.0, 1.0], dtype=np.float32)
+NEUTRAL_RGB = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+
+
+@njit(cache=True, fastmath=True)
+def _indicator_rgb(pH, pKa_ind, neutral_band, out):
+    """
+    Compiled core of `indicator_rgb_from_pH`; writes the RGB triple into
+    the 3-element buffer `out` instead of allocating.
+    """
+    # Fraction of base-colored form (In-) from indicator acid-base equilibrium
+    # f_base = 1 / (1 + 10^(pKa_ind - pH))
+    f_base = 1.0 / (1.0 + math.exp(LN10 * (pKa_ind - pH)))
+    if f_base < 0.0:
+        f_base = 0.0
+    elif f_base > 1.0:
+        f_base = 1.0
+    f_acid = 1.0 - f_base
+
+    # Strength of neutral influence: strongest near pH_target = 7 +/- neutral_band,
+    # weight goes 1 at pH_target, 0 at edge of band.
+    dist = abs(pH - 7.0)
+    w = 0.0
+    if dist < neutral_band:
+        w = 1.0 - dist / neutral_band
+
+    for i in range(3):
+        base_mix = f_acid * ACID_RGB[i] + f_base * BASE_RGB[i]
+        out[i] = (1.0 - w) * base_mix + w * NEUTRAL_RGB[i]
+
+
+@njit(cache=True, fastmath=True)
+def _pH_and_rgb(Va_L, Ca, Vb_L, Cb, pKa, Ka, Kb, pKa_ind, neutral_band, out):
+    """
+    `_compute_pH` followed by `_indicator_rgb` in one call, so a step
+    crosses into compiled code once. Writes RGB into `out`, returns pH.
+    """
+    pH = _compute_pH(Va_L, Ca, Vb_L, Cb, pKa, Ka, Kb)
+    _indicator_rgb(pH, pKa_ind, neutral_band, out)
+    return pH
 
 
 def indicator_rgb_from_pH(
@@ -79,32 +146,191 @@ def indicator_rgb_from_pH(
     - pKa_ind: indicator transition midpoint
     - neutral_band: range around pH ~7 where color is strongly "neutral"
     """
-    # Acid form color (e.g. yellow) and base form (e.g. blue)
-    acid_rgb = np.array([1.0, 1.0, 0.0], dtype=np.float32)  # yellow
-    base_rgb = np.array([0.0, 0.0, 1.0], dtype=np.float32)  # blue
-    neutral_rgb = np.array([0.0, 1.0, 0.0], dtype=np.float32)  # green
+    rgb = np.empty(3, dtype=np.float32)
+    _indicator_rgb(pH, pKa_ind, neutral_band, rgb)
+    return rgb
+
+
+# Reward-shaping tables. Tiered bonuses/penalties are looked up with
+# np.searchsorted instead of walking if/elif ladders.
+
+# Overshoot (pH - pH_target) tiers: (0, 0.1], (0.1, 0.2], ..., > 1.0
+_OVERSHOOT_THRESH = np.array([0.0, 0.1, 0.2, 0.5, 1.0])
+_OVERSHOOT_PENALTY = np.array([0.0, -10.0, -50.0, -100.0, -200.0, -500.0])
+_STOP_OVERSHOOT_PENALTY = np.array([0.0, -30.0, -100.0, -200.0, -500.0, -1000.0])
+
+# Stopping at or below target: distance tiers dist < 0.02, < 0.05, ...
+_STOP_DIST_THRESH = np.array([0.02, 0.05, 0.1, 0.2, 0.5])
+_STOP_DIST_BONUS = np.array([500.0, 300.0, 150.0, 50.0, 10.0, 0.0])
+
+# Stopping early: V/Veq tiers < 0.01, < 0.3, < 0.7
+_STOP_VOLUME_THRESH = np.array([0.01, 0.3, 0.7])
+_STOP_VOLUME_PENALTY = np.array([-50.0, -15.0, -5.0, 0.0])
+
+# Running out of steps: distance tiers dist < 0.1, < 0.5
+_TRUNC_DIST_THRESH = np.array([0.1, 0.5])
+_TRUNC_DIST_BONUS = np.array([10.0, 2.0, 0.0])
+
+# Closed-interval zone bonuses [lo, hi] that stack where they overlap.
+# The bonus at x is the cumulative bonus of zones with lo <= x minus that
+# of zones with hi < x.
+_PH_ZONE_LO = np.array([3.0, 6.5, 6.9])
+_PH_ZONE_LO_CUM = np.array([0.0, 1.0, 6.0, 26.0])
+_PH_ZONE_HI = np.array([6.0, 7.0, 7.0])
+_PH_ZONE_HI_CUM = np.array([0.0, 1.0, 6.0, 26.0])
+
+_V_ZONE_LO = np.array([0.8, 0.95])
+_V_ZONE_LO_CUM = np.array([0.0, 2.0, 7.0])
+_V_ZONE_HI = np.array([1.0, 1.0])
+_V_ZONE_HI_CUM = np.array([0.0, 2.0, 7.0])
+
+
+@njit(cache=True, fastmath=True)
+def _compute_reward(
+    pH, Vb_L, inv_Veq_L, pH_target, last_dist, terminated,
+    step_count, max_steps, max_burette_ml, burette_empty,
+):
+    """
+    Shaped reward and episode end for one step of `WeakAcidIndicatorEnv`.
 
-    # Fraction of base-colored form (In-) from indicator acid-base equilibrium
-    # f_base = 1 / (1 + 10^(pKa_ind - pH))
-    f_base = 1.0 / (1.0 + 10 ** (pKa_ind - pH))
-    f_base = float(np.clip(f_base, 0.0, 1.0))
-    f_acid = 1.0 - f_base
+    last_dist < 0 means there is no previous step to measure progress against.
+    burette_empty marks a step whose addition would overflow the burette; it
+    ends the episode with only the closeness reward and a penalty.
+    Returns (reward, dist, terminated, truncated).
+    """
+    dist = abs(pH - pH_target)
+    overshoot = pH - pH_target
+    V_ratio = Vb_L * inv_Veq_L
+
+    # Base reward: exponential closeness to target
+    reward = 50.0 * math.exp(-dist / 0.8) - 0.005
+    if burette_empty:
+        return reward - 30.0, dist, True, False
+
+    # Asymmetric penalty for overshooting (overshooting is worse than undershooting)
+    reward += _OVERSHOOT_PENALTY[np.searchsorted(_OVERSHOOT_THRESH, overshoot)]
+
+    # Progress bonus: reward getting closer, penalize moving away
+    if last_dist >= 0.0:
+        progress = last_dist - dist
+        if progress > 0:
+            reward += 5.0 * progress
+        else:
+            reward += 2.0 * progress
+            if overshoot > 0.0:
+                reward -= 20.0
+
+    # Small penalty for continuing when already in target zone
+    if 6.9 <= pH <= 7.0 and not terminated:
+        reward -= 1.0
+
+    # pH zone and volume-based guidance bonuses
+    reward += (
+        _PH_ZONE_LO_CUM[np.searchsorted(_PH_ZONE_LO, pH, side="right")]
+        - _PH_ZONE_HI_CUM[np.searchsorted(_PH_ZONE_HI, pH)]
+    )
+    reward += (
+        _V_ZONE_LO_CUM[np.searchsorted(_V_ZONE_LO, V_ratio, side="right")]
+        - _V_ZONE_HI_CUM[np.searchsorted(_V_ZONE_HI, V_ratio)]
+    )
+    if V_ratio > 1.0 and pH > 7.0:
+        reward -= 15.0
+
+    # Stopping rewards/penalties
+    truncated = False
+    if terminated:
+        if overshoot <= 0.0:
+            reward += _STOP_DIST_BONUS[np.searchsorted(_STOP_DIST_THRESH, dist, side="right")]
+        else:
+            reward += _STOP_OVERSHOOT_PENALTY[np.searchsorted(_OVERSHOOT_THRESH, overshoot)]
 
-    # Base acid/base blend
-    base_mix = f_acid * acid_rgb + f_base * base_rgb
+        # Volume-based stopping penalties
+        reward += _STOP_VOLUME_PENALTY[np.searchsorted(_STOP_VOLUME_THRESH, V_ratio, side="right")]
+        if V_ratio > 1.0 and pH > 7.0:
+            reward -= 100.0
+    elif step_count >= max_steps:
+        # Truncated: small bonus for ending near the target
+        truncated = True
+        reward += _TRUNC_DIST_BONUS[np.searchsorted(_TRUNC_DIST_THRESH, dist, side="right")]
 
-    # Strength of neutral influence: strongest near pH_target = 7 +/- neutral_band
-    pH_target = 7.0
-    dist = abs(pH - pH_target)
-    if dist >= neutral_band:
-        # Outside neutral band: just use acid/base mix
-        return base_mix
+    # Terminate on extreme pH values
+    if pH <= 0.0 or pH >= 14.0:
+        terminated = True
+        reward -= 30.0
+
+    # Check for excessive volume beyond burette capacity
+    if Vb_L * 1000.0 > max_burette_ml * 1.1:
+        terminated = True
+        reward -= 25.0
+
+    return reward, dist, terminated, truncated
+
+
+def _kernel_fingerprint() -> int:
+    """
+    Hash of the kernel sources that `_titration_kernels_build` compiles,
+    truncated to fit an int64. The AOT module embeds the value it was built
+    from, so a stale build can be told apart from the current kernels.
+    """
+    h = hashlib.sha256()
+    for kernel in (_compute_pH, _indicator_rgb, _pH_and_rgb, _compute_reward):
+        h.update(inspect.getsource(kernel.py_func).encode())
+    return int.from_bytes(h.digest()[:7], "little")
+
+
+# Kernels called from Python. Prefer the ahead-of-time compiled module built by
+# _titration_kernels_build.py, which skips JIT compilation at startup, as long
+# as it was built from the kernels above; WeakAcidVecEnv always runs those.
+try:
+    from . import titration_kernels as _aot
+except ImportError:
+    _aot = None
+
+if _aot is not None:
+    _aot_fingerprint = getattr(_aot, "kernel_fingerprint", None)
+    if _aot_fingerprint is None or _aot_fingerprint() != _kernel_fingerprint():
+        warnings.warn(
+            "src/titration_kernels was built from different kernel sources; "
+            "using the JIT kernels instead. Rebuild it with "
+            "`python -m src._titration_kernels_build`."
+        )
+        _aot = None
+
+if _aot is not None:
+    _pH_kernel, _reward_kernel = _aot.compute_pH, _aot.compute_reward
+    _rgb_kernel, _pH_rgb_kernel = _aot.indicator_rgb, _aot.pH_and_rgb
+else:
+    _pH_kernel, _reward_kernel, _rgb_kernel = _compute_pH, _compute_reward, _indicator_rgb
+    _pH_rgb_kernel = _pH_and_rgb
+
+
+# matplotlib is only needed by render(), so it is imported on first use
+# rather than by every (training) process that imports the env.
+_plt = None
+_Circle = None
 
-    # Inside neutral band: smoothly mix in neutral color.
-    # weight goes 1 at pH_target, 0 at edge of band.
-    w = 1.0 - dist / neutral_band
-    rgb = (1 - w) * base_mix + w * neutral_rgb
-    return rgb.astype(np.float32)
+
+def _import_pyplot():
+    global _plt, _Circle
+    if _plt is None:
+        import matplotlib
+        matplotlib.use('Agg')  # Non-interactive backend for headless environments
+        import matplotlib.pyplot as plt
+        from matplotlib.patches import Circle
+        _plt, _Circle = plt, Circle
+    return _plt, _Circle
+
+
+# Likewise Pillow, used only for rgb_array frames
+_PIL = None
+
+
+def _import_pil():
+    global _PIL
+    if _PIL is None:
+        from PIL import Image, ImageDraw, ImageFont
+        _PIL = (Image, ImageDraw, ImageFont)
+    return _PIL
 
 
 class WeakAcidIndicatorEnv(gym.Env):
@@ -128,6 +354,7 @@ class WeakAcidIndicatorEnv(gym.Env):
     """
 
     metadata = {"render_modes": ["human", "rgb_array", "matplotlib"]}
+    frame_size = (960, 400)  # rgb_array render (width, height) in pixels
 
     def __init__(
         self,
@@ -141,6 +368,8 @@ class WeakAcidIndicatorEnv(gym.Env):
         pKa_ind: float = 7.0,
         neutral_band: float = 0.15,
         max_burette_ml: float = 50.0,  # Realistic burette capacity
+        log_history: bool = False,  # Record (mL, pH, color) per step for render/export
+        obs_dtype=np.float32,  # e.g. np.float16 to halve rollout-buffer memory
     ):
         super().__init__()
 
@@ -151,9 +380,14 @@ class WeakAcidIndicatorEnv(gym.Env):
         self.pH_target = pH_target
         self.max_steps = max_steps
         self.step_sizes_ml = np.array(step_sizes_ml, dtype=float)
+        self._step_sizes_tuple = tuple(float(x) for x in step_sizes_ml)  # plain floats for step()
+        self._step_sizes_L = tuple(x / 1000.0 for x in self._step_sizes_tuple)
         self.pKa_ind = pKa_ind
         self.neutral_band = neutral_band
         self.max_burette_ml = max_burette_ml  # Maximum volume from burette
+        self.log_history = log_history
+        self.obs_dtype = np.dtype(obs_dtype)
+        self._cast_obs = self.obs_dtype != np.float32
 
         # Derived constants
         self.Va_L = Va_ml / 1000.0
@@ -163,189 +397,179 @@ class WeakAcidIndicatorEnv(gym.Env):
 
         # equivalence volume:
         self.Veq_L = self.n_HA0 / self.Cb
+        self._Veq_ml = self.Veq_L * 1000.0
+        self._inv_Veq_L = 1.0 / self.Veq_L
+        self._inv_max_steps = 1.0 / self.max_steps
+
+        # Acid/conjugate-base constants, fixed for the life of the env
+        self._Ka = math.exp(-LN10 * self.pKa)
+        self._Kb = KW / self._Ka
 
         # Observation: [R, G, B, Vb/Veq, step_norm]
-        low = np.array([0.0, 0.0, 0.0, 0.0, 0.0], dtype=np.float32)
-        high = np.array([1.0, 1.0, 1.0, 2.0, 1.0], dtype=np.float32)
-        self.observation_space = spaces.Box(low=low, high=high, dtype=np.float32)
+        # Observations are computed in float32 and cast to obs_dtype on the way
+        # out. Only the policy needs to match; gymnasium's Box does not accept
+        # bfloat16, so cast to that inside the policy if wanted.
+        low = np.array([0.0, 0.0, 0.0, 0.0, 0.0], dtype=self.obs_dtype)
+        high = np.array([1.0, 1.0, 1.0, 2.0, 1.0], dtype=self.obs_dtype)
+        self.observation_space = spaces.Box(low=low, high=high, dtype=self.obs_dtype)
 
         # Actions: 0..len(step_sizes) = add base; last index = stop
         self.action_space = spaces.Discrete(len(self.step_sizes_ml) + 1)
-
-        self.history = []
+        self._stop_action = len(self.step_sizes_ml)
+
+        # Per-step history as columns (Vb mL, pH, RGB), see the history property.
+        # Sized for the reset state plus max_steps steps; grows if stepped past that.
+        self._hist_Vb = np.empty(max_steps + 2, dtype=np.float64)
+        self._hist_pH = np.empty(max_steps + 2, dtype=np.float64)
+        self._hist_rgb = np.empty((max_steps + 2, 3), dtype=np.float32)
+        self._hist_len = 0
+
+        # Render targets, created on first use: Pillow image for rgb_array,
+        # matplotlib figure for human/matplotlib
+        self._frame = None
+        self._font = None
+        self._fig = None
+        self._axes = None
+
+        # Observation buffer, filled in place; _obs_rgb views its color slots
+        self._obs_buf = np.empty(5, dtype=np.float32)
+        self._obs_rgb = self._obs_buf[:3]
+
+        # Warm up the JIT kernels so compilation happens here, not mid-rollout
+        pH0 = _pH_kernel(self.Va_L, self.Ca, 0.0, self.Cb, self.pKa, self._Ka, self._Kb)
+        _rgb_kernel(pH0, self.pKa_ind, self.neutral_band, self._obs_rgb)
+        _pH_rgb_kernel(
+            self.Va_L, self.Ca, 0.0, self.Cb, self.pKa, self._Ka, self._Kb,
+            self.pKa_ind, self.neutral_band, self._obs_rgb,
+        )
+        _reward_kernel(
+            pH0, 0.0, self._inv_Veq_L, self.pH_target, -1.0, False,
+            0, self.max_steps, self.max_burette_ml, False,
+        )
 
     def _get_pH(self) -> float:
-        return compute_pH_weak_acid_titration(
-            Va_L=self.Va_L,
-            Ca=self.Ca,
-            Vb_L=self.Vb_L,
-            Cb=self.Cb,
-            pKa=self.pKa,
+        return _pH_kernel(
+            self.Va_L, self.Ca, self.Vb_L, self.Cb,
+            self.pKa, self._Ka, self._Kb,
         )
 
     def _get_obs(self, pH: float) -> np.ndarray:
-        rgb = indicator_rgb_from_pH(
-            pH,
-            pKa_ind=self.pKa_ind,
-            neutral_band=self.neutral_band,
-        )
-
-        V_ratio = self.Vb_L / self.Veq_L
-        step_norm = self.step_count / self.max_steps
+        obs = self._obs_buf
+        _rgb_kernel(pH, self.pKa_ind, self.neutral_band, self._obs_rgb)
+        obs[3] = self.Vb_L * self._inv_Veq_L
+        obs[4] = self.step_count * self._inv_max_steps
 
-        return np.concatenate([rgb, [V_ratio, step_norm]]).astype(np.float32)
+        # Callers may keep the observation around (SB3 VecEnvs keep the
+        # terminal one across reset), so never hand out the buffer itself
+        if self._cast_obs:
+            return obs.astype(self.obs_dtype)
+        return obs.copy()
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
         self.Vb_L = 0.0
         self.step_count = 0
-        self.history = []
+        self._hist_len = 0
         self._last_dist = None  # Track distance for progress bonus
         pH = self._get_pH()
         obs = self._get_obs(pH)
-        self.history.append((self.Vb_L * 1000.0, pH, obs[:3]))  # store (mL, pH, color)
+        if self.log_history:
+            self._record_history(self.Vb_L * 1000.0, pH)
 
         return obs, {}
 
     def step(self, action: int):
         self.step_count += 1
         terminated = False
-        truncated = False
+        burette_empty = False
 
         # stop action: last index
-        if action == self.action_space.n - 1:
+        if action == self._stop_action:
             terminated = True
         else:
-            delta_ml = self.step_sizes_ml[action]
+            delta_ml = self._step_sizes_tuple[action]
             new_Vb_ml = (self.Vb_L * 1000.0) + delta_ml
             
             # Check burette capacity limit
             if new_Vb_ml > self.max_burette_ml:
                 terminated = True
-                truncated = False
-                pH = self._get_pH()
-                dist = abs(pH - self.pH_target)
-                reward = 50.0 * np.exp(-dist / 0.8) - 0.005
-                reward -= 30.0
-                obs = self._get_obs(pH)
-                info = {"pH": pH, "Vb_ml": self.Vb_L * 1000.0, "dist": dist, "burette_empty": True}
-                return obs, reward, terminated, truncated, info
+                burette_empty = True
             else:
-                self.Vb_L += delta_ml / 1000.0
-
-        pH = self._get_pH()
-        self.history.append((self.Vb_L * 1000.0, pH, indicator_rgb_from_pH(pH, self.pKa_ind, self.neutral_band)))
+                self.Vb_L += self._step_sizes_L[action]
+
+        # Hot path: pH and observation computed inline with positional args
+        Vb_L = self.Vb_L
+        step_count = self.step_count
+        obs = self._obs_buf
+        pH = _pH_rgb_kernel(
+            self.Va_L, self.Ca, Vb_L, self.Cb, self.pKa, self._Ka, self._Kb,
+            self.pKa_ind, self.neutral_band, self._obs_rgb,
+        )
+        obs[3] = Vb_L * self._inv_Veq_L
+        obs[4] = step_count * self._inv_max_steps
+        if self._cast_obs:
+            obs = obs.astype(self.obs_dtype)
+        else:
+            obs = obs.copy()
 
-        # Base reward: exponential closeness to target
-        dist = abs(pH - self.pH_target)
-        reward = 50.0 * np.exp(-dist / 0.8) - 0.005
-        
-        # Asymmetric penalty for overshooting (overshooting is worse than undershooting)
-        if pH > self.pH_target:
-            overshoot_amount = pH - self.pH_target
-            if overshoot_amount > 1.0:
-                reward -= 500.0
-            elif overshoot_amount > 0.5:
-                reward -= 200.0
-            elif overshoot_amount > 0.2:
-                reward -= 100.0
-            elif overshoot_amount > 0.1:
-                reward -= 50.0
-            else:
-                reward -= 10.0
-        
-        # Progress bonus: reward getting closer, penalize moving away
-        if self._last_dist is not None:
-            progress = self._last_dist - dist
-            if progress > 0:
-                reward += 5.0 * progress
-            else:
-                reward += 2.0 * progress
-                if pH > self.pH_target:
-                    reward -= 20.0
-        self._last_dist = dist
-        
-        # Small penalty for continuing when already in target zone
-        if 6.9 <= pH <= 7.0 and not terminated:
-            reward -= 1.0
-        
-        # pH zone bonuses
-        if 3.0 <= pH <= 6.0:
-            reward += 1.0
-        if 6.5 <= pH <= 7.0:
-            reward += 5.0
-        if 6.9 <= pH <= 7.0:
-            reward += 20.0
-        
-        # Volume-based guidance
-        V_ratio = self.Vb_L / self.Veq_L
-        if 0.8 <= V_ratio <= 1.0:
-            reward += 2.0
-        if 0.95 <= V_ratio <= 1.0:
-            reward += 5.0
-        if V_ratio > 1.0 and pH > 7.0:
-            reward -= 15.0
-        
-        # Stopping rewards/penalties
-        if terminated:
-            if pH <= self.pH_target:
-                if dist < 0.02:
-                    reward += 500.0
-                elif dist < 0.05:
-                    reward += 300.0
-                elif dist < 0.1:
-                    reward += 150.0
-                elif dist < 0.2:
-                    reward += 50.0
-                elif dist < 0.5:
-                    reward += 10.0
-            else:
-                overshoot = pH - self.pH_target
-                if overshoot > 1.0:
-                    reward -= 1000.0
-                elif overshoot > 0.5:
-                    reward -= 500.0
-                elif overshoot > 0.2:
-                    reward -= 200.0
-                elif overshoot > 0.1:
-                    reward -= 100.0
-                else:
-                    reward -= 30.0
-            
-            # Volume-based stopping penalties
-            if self.Vb_L < 0.01 * self.Veq_L:
-                reward -= 50.0
-            elif self.Vb_L < 0.3 * self.Veq_L:
-                reward -= 15.0
-            elif self.Vb_L < 0.7 * self.Veq_L:
-                reward -= 5.0
-            elif self.Vb_L > 1.0 * self.Veq_L and pH > 7.0:
-                reward -= 100.0
-
-        # Truncate if max steps reached
-        if self.step_count >= self.max_steps and not terminated:
-            truncated = True
-            if dist < 0.1:
-                reward += 10.0
-            elif dist < 0.5:
-                reward += 2.0
-
-        # Terminate on extreme pH values
-        if pH <= 0.0 or pH >= 14.0:
-            terminated = True
-            reward -= 30.0
-        
-        # Check for excessive volume beyond burette capacity
-        Vb_ml = self.Vb_L * 1000.0
-        if Vb_ml > self.max_burette_ml * 1.1:
-            terminated = True
-            reward -= 25.0
+        last_dist = -1.0 if self._last_dist is None else self._last_dist
+        reward, dist, terminated, truncated = _reward_kernel(
+            pH, Vb_L, self._inv_Veq_L, self.pH_target, last_dist, terminated,
+            step_count, self.max_steps, self.max_burette_ml, burette_empty,
+        )
 
-        obs = self._get_obs(pH)
-        info = {"pH": pH, "Vb_ml": self.Vb_L * 1000.0, "dist": dist}
+        Vb_ml = Vb_L * 1000.0
+        info = {"pH": pH, "Vb_ml": Vb_ml, "dist": dist}
+        if burette_empty:
+            # Nothing was added: no history row, progress baseline unchanged
+            info["burette_empty"] = True
+        else:
+            self._last_dist = dist
+            if self.log_history:
+                self._record_history(Vb_ml, pH)
 
         return obs, reward, terminated, truncated, info
 
+    def _record_history(self, Vb_ml: float, pH: float) -> None:
+        """Append one (Vb mL, pH, RGB) row; RGB is read from the obs buffer."""
+        n = self._hist_len
+        if n == len(self._hist_Vb):
+            self._hist_Vb = np.concatenate([self._hist_Vb, np.empty_like(self._hist_Vb)])
+            self._hist_pH = np.concatenate([self._hist_pH, np.empty_like(self._hist_pH)])
+            self._hist_rgb = np.concatenate([self._hist_rgb, np.empty_like(self._hist_rgb)])
+        self._hist_Vb[n] = Vb_ml
+        self._hist_pH[n] = pH
+        self._hist_rgb[n] = self._obs_rgb
+        self._hist_len = n + 1
+
+    @property
+    def Vb_history(self) -> np.ndarray:
+        """Base volume (mL) of each recorded state. A view, valid until the next step/reset."""
+        return self._hist_Vb[:self._hist_len]
+
+    @property
+    def pH_history(self) -> np.ndarray:
+        """pH of each recorded state. A view, valid until the next step/reset."""
+        return self._hist_pH[:self._hist_len]
+
+    @property
+    def rgb_history(self) -> np.ndarray:
+        """(n, 3) float32 indicator colors. A view, valid until the next step/reset."""
+        return self._hist_rgb[:self._hist_len]
+
+    @property
+    def history(self) -> list:
+        """
+        Recorded states as (Vb mL, pH, RGB) tuples, RGB being a float32 array
+        of shape (3,). Built on access; prefer Vb_history/pH_history/rgb_history.
+        """
+        n = self._hist_len
+        return list(zip(
+            self._hist_Vb[:n].tolist(),
+            self._hist_pH[:n].tolist(),
+            self._hist_rgb[:n].copy(),
+        ))
+
     def render(self, mode="human"):
         """
         Render the environment.
@@ -354,17 +578,26 @@ class WeakAcidIndicatorEnv(gym.Env):
         - "human": Display using matplotlib (blocking)
         - "rgb_array": Return RGB array for video recording
         - "matplotlib": Return matplotlib figure (non-blocking)
+
+        Both matplotlib modes redraw and return the same figure on every call;
+        it stays open until close().
         """
-        if len(self.history) < 2:
+        if self._hist_len < 2:
             return None
             
         if mode == "human" or mode == "matplotlib":
-            fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+            plt, Circle = _import_pyplot()
+            # Redraw into one persistent figure instead of building a new one per call
+            if self._fig is None or not plt.fignum_exists(self._fig.number):
+                self._fig, self._axes = plt.subplots(1, 2, figsize=(14, 6))
+            fig, axes = self._fig, self._axes
+            for ax in axes:
+                ax.clear()
             
             # Extract trajectory data
-            Vb_ml = [h[0] for h in self.history]
-            pH_vals = [h[1] for h in self.history]
-            colors = [h[2] for h in self.history]
+            Vb_ml = self.Vb_history
+            pH_vals = self.pH_history
+            colors = self.rgb_history
             
             # Left plot: Titration curve
             ax1 = axes[0]
@@ -376,8 +609,8 @@ class WeakAcidIndicatorEnv(gym.Env):
                        zorder=5, label='Current', marker='*')
             ax1.axhline(7.0, color='gray', linestyle='--', linewidth=2, 
                        alpha=0.7, label='Target pH 7.0', zorder=1)
-            ax1.axvline(self.Veq_L * 1000, color='orange', linestyle=':', 
-                       linewidth=2, alpha=0.7, label=f'Equivalence ({self.Veq_L*1000:.1f} mL)', zorder=1)
+            ax1.axvline(self._Veq_ml, color='orange', linestyle=':', 
+                       linewidth=2, alpha=0.7, label=f'Equivalence ({self._Veq_ml:.1f} mL)', zorder=1)
             ax1.set_xlabel('Base Volume Added (mL)', fontsize=12, fontweight='bold')
             ax1.set_ylabel('pH', fontsize=12, fontweight='bold')
             ax1.set_title(f'Titration Progress (Step {self.step_count}/{self.max_steps})', 
@@ -385,7 +618,7 @@ class WeakAcidIndicatorEnv(gym.Env):
             ax1.grid(True, alpha=0.3)
             ax1.legend(loc='best', fontsize=10)
             ax1.set_ylim(0, 14)
-            ax1.set_xlim(-1, max(Vb_ml) * 1.1 if Vb_ml else 60)
+            ax1.set_xlim(-1, Vb_ml.max() * 1.1)
             
             # Right plot: Indicator color + info
             ax2 = axes[1]
@@ -403,7 +636,7 @@ Current State:
 ━━━━━━━━━━━━━━━━━━━━
 pH: {current_pH:.2f}
 Base Added: {Vb_ml[-1]:.2f} mL
-V/Veq: {Vb_ml[-1] / (self.Veq_L * 1000):.2%}
+V/Veq: {Vb_ml[-1] / self._Veq_ml:.2%}
 Step: {self.step_count}/{self.max_steps}
 Distance to Target: {abs(current_pH - self.pH_target):.2f}
             """.strip()
@@ -427,14 +660,87 @@ Distance to Target: {abs(current_pH - self.pH_target):.2f}
                 
         elif mode == "rgb_array":
             # Return RGB array for video recording
-            fig = self.render(mode="matplotlib")
-            if fig is None:
-                return None
-            fig.canvas.draw()
-            buf = np.frombuffer(fig.canvas.tostring_rgb(), dtype=np.uint8)
-            buf = buf.reshape(fig.canvas.get_width_height()[::-1] + (3,))
-            plt.close(fig)
-            return buf
+            return self._render_frame()
         else:
             return None
 
+    def close(self):
+        if self._fig is not None:
+            _plt.close(self._fig)
+            self._fig = None
+            self._axes = None
+
+    def _render_frame(self) -> np.ndarray:
+        """
+        Rasterize the titration curve and indicator color straight into an
+        RGB frame with Pillow. Much cheaper than a matplotlib figure per frame.
+        """
+        Image, ImageDraw, ImageFont = _import_pil()
+        W, H = self.frame_size
+        if self._frame is None:
+            self._frame = Image.new("RGB", (W, H))
+            self._font = ImageFont.load_default()
+        draw = ImageDraw.Draw(self._frame)
+        draw.rectangle((0, 0, W, H), fill="white")
+        font = self._font
+
+        Vb_ml = self.Vb_history
+        pH_vals = self.pH_history
+        current_color = self.rgb_history[-1]
+
+        # Left panel: titration curve on [-1, 1.1 * max Vb] x [0, 14]
+        x0, y0, x1, y1 = 50, 20, int(W * 0.62), H - 40
+        v_lo, v_hi = -1.0, max(Vb_ml.max() * 1.1, 1.0)
+
+        def to_px(v, pH):
+            return (
+                x0 + (v - v_lo) / (v_hi - v_lo) * (x1 - x0),
+                y1 - pH / 14.0 * (y1 - y0),
+            )
+
+        for pH_tick in range(0, 15, 2):
+            _, y = to_px(v_lo, pH_tick)
+            draw.line((x0 - 4, y, x0, y), fill="black")
+            draw.text((x0 - 8, y), f"{pH_tick}", fill="black", font=font, anchor="rm")
+        for v_tick in np.linspace(0.0, v_hi, 5):
+            x, _ = to_px(v_tick, 0.0)
+            draw.line((x, y1, x, y1 + 4), fill="black")
+            draw.text((x, y1 + 8), f"{v_tick:.1f}", fill="black", font=font, anchor="mt")
+        draw.text(((x0 + x1) / 2, H - 12), "Base Volume Added (mL)", fill="black", font=font, anchor="mm")
+
+        # Target pH (dashed) and equivalence volume (dotted)
+        _, y_target = to_px(v_lo, 7.0)
+        for x in range(x0, x1, 12):
+            draw.line((x, y_target, min(x + 6, x1), y_target), fill=(128, 128, 128), width=2)
+        x_eq, _ = to_px(self._Veq_ml, 0.0)
+        if x0 <= x_eq <= x1:
+            for y in range(y0, y1, 6):
+                draw.line((x_eq, y, x_eq, min(y + 2, y1)), fill=(255, 165, 0), width=2)
+
+        # Trajectory, start (green square) and current (red dot) markers
+        xs, ys = to_px(Vb_ml, pH_vals)
+        points = list(zip(xs.tolist(), ys.tolist()))
+        draw.line(points, fill=(70, 130, 180), width=3)
+        for x, y in points:
+            draw.ellipse((x - 3, y - 3, x + 3, y + 3), fill=(70, 130, 180))
+        x, y = points[0]
+        draw.rectangle((x - 6, y - 6, x + 6, y + 6), fill="green")
+        x, y = points[-1]
+        draw.ellipse((x - 7, y - 7, x + 7, y + 7), fill="red")
+        draw.rectangle((x0, y0, x1, y1), outline="black")
+
+        # Right panel: indicator color + info
+        cx, cy, r = (x1 + W) // 2, y0 + (y1 - y0) // 3, min(W - x1, H) // 4
+        fill = tuple(int(round(255 * float(c))) for c in current_color)
+        draw.ellipse((cx - r, cy - r, cx + r, cy + r), fill=fill, outline="black", width=3)
+        info_text = (
+            f"pH: {pH_vals[-1]:.2f}\n"
+            f"Base Added: {Vb_ml[-1]:.2f} mL\n"
+            f"V/Veq: {Vb_ml[-1] / self._Veq_ml:.2%}\n"
+            f"Step: {self.step_count}/{self.max_steps}\n"
+            f"Distance to Target: {abs(pH_vals[-1] - self.pH_target):.2f}"
+        )
+        draw.multiline_text((cx, cy + r + 20), info_text, fill="black", font=font, anchor="ma", align="center")
+
+        return np.array(self._frame)
+
@@ -0,0 +1,223 @@
+import numpy as np
+from numba import njit, prange
+from stable_baselines3.common.vec_env import VecEnv
+
+from src.titration_env import (
+    WeakAcidIndicatorEnv,
+    _compute_pH,
+    _compute_reward,
+    _indicator_rgb,
+)
+
+
+@njit(cache=True, parallel=True)
+def _step_batch(
+    Vb_L,
+    step_count,
+    last_dist,
+    actions,
+    step_sizes_ml,
+    Va_L,
+    Ca,
+    Cb,
+    pKa,
+    Ka,
+    Kb,
+    pKa_ind,
+    neutral_band,
+    pH_target,
+    inv_Veq_L,
+    inv_max_steps,
+    max_steps,
+    max_burette_ml,
+    out_obs,
+    out_reward,
+    out_terminated,
+    out_truncated,
+    out_pH,
+    out_Vb_ml,
+    out_burette_empty,
+    out_terminal_obs,
+):
+    """
+    Advance N independent titrations by one step, mirroring
+    `WeakAcidIndicatorEnv.step`. The state arrays (Vb_L, step_count,
+    last_dist) are updated in place; finished envs are reset and their last
+    observation is copied to out_terminal_obs.
+    """
+    stop_action = step_sizes_ml.shape[0]
+    pH0 = _compute_pH(Va_L, Ca, 0.0, Cb, pKa, Ka, Kb)
+
+    for i in prange(actions.shape[0]):
+        step_count[i] += 1
+        terminated = False
+        burette_empty = False
+
+        # stop action: last index
+        action = actions[i]
+        if action == stop_action:
+            terminated = True
+        else:
+            delta_ml = step_sizes_ml[action]
+            # Check burette capacity limit
+            if Vb_L[i] * 1000.0 + delta_ml > max_burette_ml:
+                terminated = True
+                burette_empty = True
+            else:
+                Vb_L[i] += delta_ml / 1000.0
+
+        pH = _compute_pH(Va_L, Ca, Vb_L[i], Cb, pKa, Ka, Kb)
+        reward, dist, terminated, truncated = _compute_reward(
+            pH, Vb_L[i], inv_Veq_L, pH_target, last_dist[i], terminated,
+            step_count[i], max_steps, max_burette_ml, burette_empty,
+        )
+        if not burette_empty:
+            last_dist[i] = dist
+
+        obs = out_obs[i]
+        _indicator_rgb(pH, pKa_ind, neutral_band, obs)
+        obs[3] = Vb_L[i] * inv_Veq_L
+        obs[4] = step_count[i] * inv_max_steps
+
+        out_reward[i] = reward
+        out_terminated[i] = terminated
+        out_truncated[i] = truncated
+        out_pH[i] = pH
+        out_Vb_ml[i] = Vb_L[i] * 1000.0
+        out_burette_empty[i] = burette_empty
+
+        # Auto-reset finished titrations
+        if terminated or truncated:
+            out_terminal_obs[i, :] = obs
+            Vb_L[i] = 0.0
+            step_count[i] = 0
+            last_dist[i] = -1.0
+            _indicator_rgb(pH0, pKa_ind, neutral_band, obs)
+            obs[3] = 0.0
+            obs[4] = 0.0
+
+
+class WeakAcidVecEnv(VecEnv):
+    """
+    `num_envs` copies of `WeakAcidIndicatorEnv` stepped together in a single
+    Numba-parallel kernel, behind the Stable-Baselines3 VecEnv API.
+
+    Dynamics and rewards match the single env. Finished envs auto-reset and
+    report their last observation under info["terminal_observation"]; wrap
+    in `VecMonitor` to get episode statistics.
+
+    Keyword arguments are forwarded to `WeakAcidIndicatorEnv`, which is used
+    as a template for the parameters and spaces. get_attr/set_attr read and
+    write the per-env Vb_L and step_count; parameters are read-only, and
+    per-env state the batch does not keep raises AttributeError.
+    """
+
+    def __init__(self, num_envs: int = 16, **env_kwargs):
+        self.template = WeakAcidIndicatorEnv(**env_kwargs)
+        super().__init__(num_envs, self.template.observation_space, self.template.action_space)
+
+        # Per-env state
+        self.Vb_L = np.zeros(num_envs, dtype=np.float64)
+        self.step_count = np.zeros(num_envs, dtype=np.int64)
+        self._last_dist = np.full(num_envs, -1.0)
+
+        # Kernel outputs
+        self._obs = np.empty((num_envs, 5), dtype=np.float32)
+        self._terminal_obs = np.empty((num_envs, 5), dtype=np.float32)
+        self._rewards = np.empty(num_envs, dtype=np.float64)
+        self._terminated = np.empty(num_envs, dtype=bool)
+        self._truncated = np.empty(num_envs, dtype=bool)
+        self._pH = np.empty(num_envs, dtype=np.float64)
+        self._Vb_ml = np.empty(num_envs, dtype=np.float64)
+        self._burette_empty = np.empty(num_envs, dtype=bool)
+
+        self._actions = np.zeros(num_envs, dtype=np.int64)
+
+    def reset(self):
+        env = self.template
+        self.Vb_L[:] = 0.0
+        self.step_count[:] = 0
+        self._last_dist[:] = -1.0
+        self._reset_seeds()
+        self._reset_options()
+
+        obs, _ = env.reset()
+        self._obs[:] = obs
+        return self._obs.astype(self.observation_space.dtype)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        env = self.template
+        _step_batch(
+            self.Vb_L, self.step_count, self._last_dist, self._actions,
+            env.step_sizes_ml, env.Va_L, env.Ca, env.Cb,
+            env.pKa, env._Ka, env._Kb, env.pKa_ind, env.neutral_band, env.pH_target,
+            env._inv_Veq_L, env._inv_max_steps, env.max_steps, env.max_burette_ml,
+            self._obs, self._rewards, self._terminated, self._truncated,
+            self._pH, self._Vb_ml, self._burette_empty, self._terminal_obs,
+        )
+
+        dones = self._terminated | self._truncated
+        infos = [
+            {"pH": pH, "Vb_ml": Vb_ml, "dist": abs(pH - env.pH_target)}
+            for pH, Vb_ml in zip(self._pH.tolist(), self._Vb_ml.tolist())
+        ]
+        for i in np.flatnonzero(dones).tolist():
+            info = infos[i]
+            info["terminal_observation"] = self._terminal_obs[i].astype(self.observation_space.dtype)
+            info["TimeLimit.truncated"] = bool(self._truncated[i] and not self._terminated[i])
+            if self._burette_empty[i]:
+                info["burette_empty"] = True
+
+        return self._obs.astype(self.observation_space.dtype), self._rewards.astype(np.float32), dones, infos
+
+    def close(self) -> None:
+        pass
+
+    # Template attributes that are per-env state: the first group is held by
+    # the batch arrays, the rest (history, buffers, RNG) is not tracked per env
+    _BATCHED_STATE = {"Vb_L": "Vb_L", "step_count": "step_count", "_last_dist": "_last_dist"}
+    _UNBATCHED_STATE = frozenset({
+        "history", "Vb_history", "pH_history", "rgb_history",
+        "_hist_Vb", "_hist_pH", "_hist_rgb", "_hist_len",
+        "_obs_buf", "_obs_rgb", "_frame", "_fig", "_axes", "np_random",
+    })
+    # Template methods that read or advance an episode
+    _STATEFUL_METHODS = frozenset({
+        "reset", "step", "render", "_get_pH", "_get_obs", "_record_history", "_render_frame",
+    })
+
+    def get_attr(self, attr_name, indices=None):
+        indices = self._get_indices(indices)
+        if attr_name in self._BATCHED_STATE:
+            values = getattr(self, self._BATCHED_STATE[attr_name])
+            return [values[i].item() for i in indices]
+        if attr_name in self._UNBATCHED_STATE:
+            raise AttributeError(f"WeakAcidVecEnv does not keep per-env {attr_name!r}")
+        # Parameters are shared, so every env reports the template's value
+        value = getattr(self.template, attr_name)
+        return [value for _ in indices]
+
+    def set_attr(self, attr_name, value, indices=None) -> None:
+        if attr_name not in self._BATCHED_STATE:
+            raise AttributeError(
+                f"Cannot set {attr_name!r}: WeakAcidVecEnv envs share one parameter set, "
+                "fixed at construction; create a new WeakAcidVecEnv instead"
+            )
+        values = getattr(self, self._BATCHED_STATE[attr_name])
+        for i in self._get_indices(indices):
+            values[i] = value
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        if method_name in self._STATEFUL_METHODS:
+            raise AttributeError(
+                f"WeakAcidVecEnv cannot call {method_name!r} per env: episode state lives "
+                "in the batch arrays, not in an env object"
+            )
+        method = getattr(self.template, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
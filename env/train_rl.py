@@ -4,27 +4,25 @@ from pathlib import Path
 
 from stable_baselines3 import PPO
 from stable_baselines3.common.callbacks import CallbackList, EvalCallback
-from stable_baselines3.common.env_util import make_vec_env
-from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.common.vec_env import VecMonitor
 import torch
 
-from src.titration_env import WeakAcidIndicatorEnv
+from src.titration_vec_env import WeakAcidVecEnv
 from training_callback import EpisodeVisualizationCallback, ReliabilityEarlyStopCallback
 
 
-def make_env():
-    return WeakAcidIndicatorEnv(
-        Va_ml=50.0,
-        Ca=0.1,
-        Cb=0.1,
-        pKa=4.76,
-        pH_target=7.0,
-        max_steps=200,
-        step_sizes_ml=(0.1, 0.2, 0.5, 1.0, 2.0, 3.0),
-        pKa_ind=7.0,
-        neutral_band=0.15,
-        max_burette_ml=50.0,  # Standard burette capacity
-    )
+ENV_KWARGS = dict(
+    Va_ml=50.0,
+    Ca=0.1,
+    Cb=0.1,
+    pKa=4.76,
+    pH_target=7.0,
+    max_steps=200,
+    step_sizes_ml=(0.1, 0.2, 0.5, 1.0, 2.0, 3.0),
+    pKa_ind=7.0,
+    neutral_band=0.15,
+    max_burette_ml=50.0,  # Standard burette capacity
+)
 
 
 def main():
@@ -32,12 +30,16 @@ def main():
     models_dir = root / "models"
     models_dir.mkdir(exist_ok=True)
 
-    # Vectorized env for parallel rollout (16 copies for faster training)
-    vec_env = make_vec_env(make_env, n_envs=16)
+    # Vectorized env for parallel rollout (16 copies for faster training).
+    # All copies are stepped in one batched kernel; VecMonitor adds the
+    # episode stats the callbacks read from info["episode"].
+    vec_env = VecMonitor(WeakAcidVecEnv(num_envs=16, **ENV_KWARGS))
     
-    # Single env for visualization + evaluation callbacks
-    single_env = make_env()
-    eval_env = make_env()
+    # Evaluation env, one copy per evaluation episode so they all run in a
+    # single batch. Also handed to the visualization callback, which only
+    # reads episode stats from the rollout infos and never steps it.
+    n_eval_episodes = 32
+    eval_env = WeakAcidVecEnv(num_envs=n_eval_episodes, **ENV_KWARGS)
 
     # Check if tensorboard is available
     try:
@@ -49,7 +51,7 @@ def main():
 
     # Setup callbacks: training visualization + reliability-based early stopping
     vis_callback = EpisodeVisualizationCallback(
-        env=single_env,
+        env=eval_env,
         log_dir=str(root / "training_visualizations"),
         save_freq=250,
         verbose=1,
@@ -57,7 +59,7 @@ def main():
     reliability_callback = ReliabilityEarlyStopCallback(
         eval_env=eval_env,
         eval_freq=50_000,         # Evaluate every 50k steps
-        n_eval_episodes=32,       # Number of eval episodes per check
+        n_eval_episodes=n_eval_episodes,  # Number of eval episodes per check
         pH_low=6.9,
         pH_high=7.05,
         success_threshold=0.9,    # 90% of eval episodes must succeed
@@ -66,6 +68,15 @@ def main():
     )
     callbacks = CallbackList([vis_callback, reliability_callback])
 
+    # Run the policy/value network on the GPU when there is one. TF32 matmuls
+    # (Ampere+) and fused Adam cut the update cost; eps=1e-5 is SB3's own
+    # Adam default, which passing optimizer_kwargs would otherwise drop.
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    optimizer_kwargs = None
+    if device == "cuda":
+        torch.set_float32_matmul_precision("high")
+        optimizer_kwargs = dict(eps=1e-5, fused=True)
+
     # Hyperparameters tuned to prevent overshooting
     model = PPO(
         "MlpPolicy",
@@ -84,7 +95,9 @@ def main():
         policy_kwargs=dict(
             net_arch=[512, 512, 256],
             activation_fn=torch.nn.Tanh,
+            optimizer_kwargs=optimizer_kwargs,
         ),
+        device=device,
     )
 
     # Extended training for robust convergence
@@ -95,7 +108,7 @@ def main():
     print(f"{'='*70}")
     print(f"Environment: 200 max steps, 7 action options, 50mL burette limit")
     print(f"Training: 10,000,000 timesteps with 16 parallel environments")
-    print(f"Network: [512, 512, 256] architecture with Tanh activation")
+    print(f"Network: [512, 512, 256] architecture with Tanh activation ({device})")
     print(f"Exploration: Entropy coefficient 0.05")
     print(f"Learning rate: 2e-4 with 15 epochs per rollout")
     print(f"Reward: Asymmetric anti-overshoot penalties (pH>7.0 heavily penalized)")
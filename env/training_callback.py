@@ -5,15 +5,162 @@ This callback periodically visualizes episodes during training to show
 how the agent's policy improves over time.
 """
 
+import copy
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, Optional
 
-import matplotlib
-matplotlib.use('Agg')  # Non-interactive backend
-import matplotlib.pyplot as plt
 import numpy as np
 from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnv
+
+
+def _moving_average(a: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` points, like np.convolve(..., mode='valid'), in O(N)."""
+    cs = np.concatenate(([0.0], np.cumsum(a, dtype=np.float64)))
+    return (cs[window:] - cs[:-window]) / window
+
+
+class _RunningStats:
+    """Running mean/std/min/max of a stream (Welford's algorithm); all 0 when empty."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._M2 = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def update(self, x: float) -> None:
+        x = float(x)
+        self.n += 1
+        if self.n == 1:
+            self.min = self.max = x
+        elif x < self.min:
+            self.min = x
+        elif x > self.max:
+            self.max = x
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._M2 += delta * (x - self.mean)
+
+    @property
+    def std(self) -> float:
+        """Population std, as np.std."""
+        return (self._M2 / self.n) ** 0.5 if self.n else 0.0
+
+
+# Figure reused by _render_progress_png within one (worker) process
+_progress_fig = None
+_progress_axes = None
+
+
+def _render_progress_png(save_path, episode_count, rewards, lengths, reward_stats, length_stats):
+    """
+    Draw the training-progress figure and write it to save_path. Runs in
+    EpisodeVisualizationCallback's worker process, so it only gets
+    picklable snapshots: reward/length arrays of the retained episodes
+    (oldest first) and the running stats over all episodes.
+    """
+    # One figure per rendering process; its axes are cleared and redrawn per save
+    global _progress_fig, _progress_axes
+    if _progress_fig is None:
+        # Imported here so processes that never render (e.g. evaluation-only
+        # callback users) skip the matplotlib import
+        import matplotlib
+        matplotlib.use('Agg')  # Non-interactive backend
+        import matplotlib.pyplot as plt
+        _progress_fig, _progress_axes = plt.subplots(2, 2, figsize=(14, 10))
+    fig, axes = _progress_fig, _progress_axes
+    for ax in axes.flat:
+        ax.clear()
+    
+    # Episode numbers of the retained window
+    first = episode_count - len(rewards)
+    episodes = np.arange(first, episode_count)
+
+    # Plot 1: Episode rewards over time
+    ax1 = axes[0, 0]
+    if len(rewards) > 0:
+        ax1.plot(episodes, rewards, alpha=0.6, linewidth=1, label='Episode Rewards')
+        # Moving average
+        if len(rewards) > 10:
+            window = min(50, len(rewards) // 10)
+            moving_avg = _moving_average(rewards, window)
+            ax1.plot(episodes[window-1:], 
+                    moving_avg, 'r-', linewidth=2, label='Moving Average')
+    ax1.set_xlabel('Episode', fontweight='bold')
+    ax1.set_ylabel('Episode Reward', fontweight='bold')
+    ax1.set_title('Training Progress: Episode Rewards', fontweight='bold')
+    ax1.grid(True, alpha=0.3)
+    if len(rewards) > 10:
+        ax1.legend()
+    
+    # Plot 2: Episode lengths
+    ax2 = axes[0, 1]
+    if len(lengths) > 0:
+        ax2.plot(episodes, lengths, alpha=0.6, linewidth=1, color='green', label='Episode Lengths')
+        if len(lengths) > 10:
+            window = min(50, len(lengths) // 10)
+            moving_avg = _moving_average(lengths, window)
+            ax2.plot(episodes[window-1:], 
+                    moving_avg, 'r-', linewidth=2, label='Moving Average')
+    ax2.set_xlabel('Episode', fontweight='bold')
+    ax2.set_ylabel('Episode Length (steps)', fontweight='bold')
+    ax2.set_title('Training Progress: Episode Lengths', fontweight='bold')
+    ax2.grid(True, alpha=0.3)
+    if len(lengths) > 10:
+        ax2.legend()
+    
+    # Plot 3: Reward distribution
+    ax3 = axes[1, 0]
+    if len(rewards) > 0:
+        ax3.hist(rewards, bins=30, alpha=0.7, edgecolor='black')
+        # Mean of the plotted (retained) episodes; the all-episode stats go in plot 4
+        window_mean = rewards.mean()
+        ax3.axvline(window_mean, color='red', 
+                   linestyle='--', linewidth=2, label=f'Mean: {window_mean:.2f}')
+    ax3.set_xlabel('Episode Reward', fontweight='bold')
+    ax3.set_ylabel('Frequency', fontweight='bold')
+    ax3.set_title('Reward Distribution', fontweight='bold')
+    ax3.legend()
+    ax3.grid(True, alpha=0.3, axis='y')
+    
+    # Plot 4: Statistics
+    ax4 = axes[1, 1]
+    ax4.axis('off')
+    r, l = reward_stats, length_stats
+    stats_text = f"""
+Training Statistics
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Total Episodes: {episode_count}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Reward Statistics:
+  Mean: {r.mean:.2f}
+  Std:  {r.std:.2f}
+  Min:  {r.min:.2f}
+  Max:  {r.max:.2f}
+  Latest: {rewards[-1] if episode_count else 0:.2f}
+
+Episode Length Statistics:
+  Mean: {l.mean:.1f}
+  Std:  {l.std:.1f}
+  Min:  {l.min:.0f}
+  Max:  {l.max:.0f}
+    """.strip()
+    ax4.text(0.1, 0.5, stats_text, transform=ax4.transAxes,
+            fontsize=11, va='center', family='monospace',
+            bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.8))
+    
+    fig.suptitle(f'Training Progress at Episode {episode_count}', 
+                fontsize=16, fontweight='bold', y=0.98)
+    fig.tight_layout()
+    
+    fig.savefig(save_path, dpi=150)
+    return save_path
 
 
 class EpisodeVisualizationCallback(BaseCallback):
@@ -29,6 +176,7 @@ class EpisodeVisualizationCallback(BaseCallback):
         env,
         log_dir: str = None,
         save_freq: int = 1000,  # Save every N episodes
+        history_cap: int = 100_000,  # Episodes kept for the plots
         verbose: int = 0,
     ):
         super().__init__(verbose)
@@ -37,14 +185,57 @@ class EpisodeVisualizationCallback(BaseCallback):
         self.log_dir.mkdir(exist_ok=True, parents=True)
         self.save_freq = save_freq
         self.episode_count = 0
-        self.episode_rewards = []
-        self.episode_lengths = []
         self.final_pHs = []
         self.final_Vbs = []
-        
+
+        # Rewards/lengths of the last history_cap episodes, in ring buffers
+        # indexed by episode_count % history_cap
+        self.history_cap = history_cap
+        self._rewards = np.empty(history_cap, dtype=np.float32)
+        self._lengths = np.empty(history_cap, dtype=np.int32)
+        # Running stats over all episodes (Welford mean/M2, min, max)
+        self._reward_stats = _RunningStats()
+        self._length_stats = _RunningStats()
+
+        # Progress plots are rendered in a worker process, started on the first save
+        self._executor = None
+        self._pending = None
+
+    def _ordered(self, ring: np.ndarray) -> np.ndarray:
+        """Retained entries of a ring buffer, oldest first."""
+        n = self.episode_count
+        if n <= self.history_cap:
+            return ring[:n]
+        i = n % self.history_cap
+        return np.concatenate((ring[i:], ring[:i]))
+
+    @property
+    def episode_rewards(self) -> np.ndarray:
+        """Rewards of the last history_cap episodes, oldest first."""
+        return self._ordered(self._rewards)
+
+    @property
+    def episode_lengths(self) -> np.ndarray:
+        """Lengths of the last history_cap episodes, oldest first."""
+        return self._ordered(self._lengths)
+
+    def _record_episode(self, reward: float, length: float) -> None:
+        n = self.episode_count
+        self._rewards[n % self.history_cap] = reward
+        self._lengths[n % self.history_cap] = length
+        self._reward_stats.update(reward)
+        self._length_stats.update(length)
+        self.episode_count = n + 1
+
     def _on_step(self) -> bool:
         """Called after each step."""
         return True
+
+    def _on_training_end(self) -> None:
+        if self._executor is not None:
+            self._wait_for_render()
+            self._executor.shutdown()
+            self._executor = None
     
     def _on_rollout_end(self) -> None:
         """Called at the end of each rollout (collection of steps)."""
@@ -55,9 +246,7 @@ class EpisodeVisualizationCallback(BaseCallback):
             for info in infos:
                 if "episode" in info:
                     episode_info = info["episode"]
-                    self.episode_count += 1
-                    self.episode_rewards.append(episode_info["r"])
-                    self.episode_lengths.append(episode_info["l"])
+                    self._record_episode(episode_info["r"], episode_info["l"])
                     
                     # Try to get final pH and Vb from the environment
                     # This requires accessing the env's internal state
@@ -70,96 +259,35 @@ class EpisodeVisualizationCallback(BaseCallback):
         return True
     
     def _save_training_progress(self):
-        """Save training progress visualization."""
-        fig, axes = plt.subplots(2, 2, figsize=(14, 10))
-        
-        # Plot 1: Episode rewards over time
-        ax1 = axes[0, 0]
-        if len(self.episode_rewards) > 0:
-            ax1.plot(self.episode_rewards, alpha=0.6, linewidth=1, label='Episode Rewards')
-            # Moving average
-            if len(self.episode_rewards) > 10:
-                window = min(50, len(self.episode_rewards) // 10)
-                moving_avg = np.convolve(
-                    self.episode_rewards, 
-                    np.ones(window)/window, 
-                    mode='valid'
-                )
-                ax1.plot(range(window-1, len(self.episode_rewards)), 
-                        moving_avg, 'r-', linewidth=2, label='Moving Average')
-        ax1.set_xlabel('Episode', fontweight='bold')
-        ax1.set_ylabel('Episode Reward', fontweight='bold')
-        ax1.set_title('Training Progress: Episode Rewards', fontweight='bold')
-        ax1.grid(True, alpha=0.3)
-        if len(self.episode_rewards) > 10:
-            ax1.legend()
-        
-        # Plot 2: Episode lengths
-        ax2 = axes[0, 1]
-        if len(self.episode_lengths) > 0:
-            ax2.plot(self.episode_lengths, alpha=0.6, linewidth=1, color='green', label='Episode Lengths')
-            if len(self.episode_lengths) > 10:
-                window = min(50, len(self.episode_lengths) // 10)
-                moving_avg = np.convolve(
-                    self.episode_lengths, 
-                    np.ones(window)/window, 
-                    mode='valid'
-                )
-                ax2.plot(range(window-1, len(self.episode_lengths)), 
-                        moving_avg, 'r-', linewidth=2, label='Moving Average')
-        ax2.set_xlabel('Episode', fontweight='bold')
-        ax2.set_ylabel('Episode Length (steps)', fontweight='bold')
-        ax2.set_title('Training Progress: Episode Lengths', fontweight='bold')
-        ax2.grid(True, alpha=0.3)
-        if len(self.episode_lengths) > 10:
-            ax2.legend()
-        
-        # Plot 3: Reward distribution
-        ax3 = axes[1, 0]
-        if len(self.episode_rewards) > 0:
-            ax3.hist(self.episode_rewards, bins=30, alpha=0.7, edgecolor='black')
-            ax3.axvline(np.mean(self.episode_rewards), color='red', 
-                       linestyle='--', linewidth=2, label=f'Mean: {np.mean(self.episode_rewards):.2f}')
-        ax3.set_xlabel('Episode Reward', fontweight='bold')
-        ax3.set_ylabel('Frequency', fontweight='bold')
-        ax3.set_title('Reward Distribution', fontweight='bold')
-        ax3.legend()
-        ax3.grid(True, alpha=0.3, axis='y')
-        
-        # Plot 4: Statistics
-        ax4 = axes[1, 1]
-        ax4.axis('off')
-        stats_text = f"""
-Training Statistics
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Total Episodes: {self.episode_count}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Reward Statistics:
-  Mean: {np.mean(self.episode_rewards) if self.episode_rewards else 0:.2f}
-  Std:  {np.std(self.episode_rewards) if self.episode_rewards else 0:.2f}
-  Min:  {np.min(self.episode_rewards) if self.episode_rewards else 0:.2f}
-  Max:  {np.max(self.episode_rewards) if self.episode_rewards else 0:.2f}
-  Latest: {self.episode_rewards[-1] if self.episode_rewards else 0:.2f}
+        """
+        Save training progress visualization. Rendering runs in a worker
+        process so the learner does not wait on matplotlib; at most one
+        render is in flight.
+        """
+        if self._executor is None:
+            # spawn: don't fork a process that holds torch/CUDA state
+            self._executor = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+            )
+        self._wait_for_render()
 
-Episode Length Statistics:
-  Mean: {np.mean(self.episode_lengths) if self.episode_lengths else 0:.1f}
-  Std:  {np.std(self.episode_lengths) if self.episode_lengths else 0:.1f}
-  Min:  {np.min(self.episode_lengths) if self.episode_lengths else 0:.0f}
-  Max:  {np.max(self.episode_lengths) if self.episode_lengths else 0:.0f}
-        """.strip()
-        ax4.text(0.1, 0.5, stats_text, transform=ax4.transAxes,
-                fontsize=11, va='center', family='monospace',
-                bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.8))
-        
-        plt.suptitle(f'Training Progress at Episode {self.episode_count}', 
-                    fontsize=16, fontweight='bold', y=0.98)
-        plt.tight_layout()
-        
+        # Snapshots: the buffers keep changing while the worker draws
         save_path = self.log_dir / f"training_progress_ep{self.episode_count:06d}.png"
-        plt.savefig(save_path, dpi=150, bbox_inches='tight')
-        plt.close()
-        
+        self._pending = self._executor.submit(
+            _render_progress_png,
+            save_path,
+            self.episode_count,
+            self.episode_rewards.copy(),
+            self.episode_lengths.copy(),
+            copy.copy(self._reward_stats),
+            copy.copy(self._length_stats),
+        )
+
+    def _wait_for_render(self) -> None:
+        if self._pending is None:
+            return
+        save_path = self._pending.result()
+        self._pending = None
         if self.verbose > 0:
             print(f"Saved training visualization to {save_path}")
 
@@ -174,6 +302,9 @@ class ReliabilityEarlyStopCallback(BaseCallback):
     evaluations.
 
     Stops training once the agent reliably reaches pH 6.9–7.05.
+
+    eval_env may be a single gym env or an SB3 VecEnv; a VecEnv (ideally
+    n_eval_episodes wide) runs the evaluation episodes in parallel.
     """
 
     def __init__(
@@ -237,22 +368,51 @@ class ReliabilityEarlyStopCallback(BaseCallback):
         Run n_eval_episodes using the current policy and compute the fraction
         of episodes that end with final pH in the target band.
         """
-        successes = 0
-        for _ in range(self.n_eval_episodes):
-            obs, _ = self.eval_env.reset()
-            done = False
-            truncated = False
-            final_pH = None
+        if isinstance(self.eval_env, VecEnv):
+            final_pH = self._final_pH_vec()
+        else:
+            final_pH = self._final_pH()
+
+        successes = np.count_nonzero((final_pH >= self.pH_low) & (final_pH <= self.pH_high))
+        return successes / float(self.n_eval_episodes)
 
+    def _final_pH(self) -> np.ndarray:
+        """Final pH of each evaluation episode, run one at a time on a gym env."""
+        env = self.eval_env
+        predict = self.model.predict
+        final_pH = np.empty(self.n_eval_episodes)
+        for k in range(self.n_eval_episodes):
+            obs, _ = env.reset()
+            done = truncated = False
             while not (done or truncated):
-                action, _ = self.model.predict(obs, deterministic=True)
-                obs, _, done, truncated, info = self.eval_env.step(action)
-                # Track last pH from info
-                if "pH" in info:
-                    final_pH = float(info["pH"])
+                action, _ = predict(obs, deterministic=True)
+                obs, _, done, truncated, info = env.step(action)
+            # Only the last step's pH matters
+            final_pH[k] = info["pH"]
+        return final_pH
 
-            if final_pH is not None and self.pH_low <= final_pH <= self.pH_high:
-                successes += 1
+    def _final_pH_vec(self) -> np.ndarray:
+        """
+        Final pH of each evaluation episode, run in lockstep on a VecEnv so
+        each policy call predicts a whole batch of actions. With num_envs ==
+        n_eval_episodes every env runs exactly one episode.
+        """
+        env = self.eval_env
+        n = env.num_envs
+        # Episodes left per env, splitting n_eval_episodes as evenly as possible
+        remaining = np.full(n, self.n_eval_episodes // n)
+        remaining[:self.n_eval_episodes % n] += 1
 
-        return successes / float(self.n_eval_episodes)
+        final_pH = np.empty(self.n_eval_episodes)
+        k = 0
+        obs = env.reset()
+        while k < self.n_eval_episodes:
+            actions, _ = self.model.predict(obs, deterministic=True)
+            obs, _, dones, infos = env.step(actions)
+            # infos of finished envs describe the episode before auto-reset
+            for i in np.flatnonzero(dones & (remaining > 0)).tolist():
+                final_pH[k] = infos[i]["pH"]
+                remaining[i] -= 1
+                k += 1
+        return final_pH
 
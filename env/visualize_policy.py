@@ -1,32 +1,46 @@
 # env/visualize_policy.py
 
+import functools
 from pathlib import Path
 
 import matplotlib.pyplot as plt
 import numpy as np
 from stable_baselines3 import PPO
+import torch
 
 from src.titration_env import WeakAcidIndicatorEnv
 
 
+@functools.lru_cache(maxsize=4)
+def _load_ppo(path: str, mtime: float) -> PPO:
+    # Keyed on mtime so repeated main() calls in one process reuse the model
+    # until the zip on disk is replaced
+    model = PPO.load(path)
+    # Inference only: no autograd bookkeeping for the policy
+    model.policy.set_training_mode(False)
+    model.policy.requires_grad_(False)
+    return model
+
+
 def run_episode(env, model=None, deterministic=True, max_steps=200):
     obs, _ = env.reset()
-    traj = {
-        "Vb_ml": [],
-        "pH": [],
-        "color": [],
-        "action": [],
-        "reward": [],
-    }
+
+    # One row per state: the initial state plus up to max_steps steps
+    n = max_steps + 1
+    Vb = np.empty(n)
+    pH_arr = np.empty(n)
+    color = np.empty((n, 3), dtype=np.float32)
+    actions = np.empty(n, dtype=np.int64)
+    rewards = np.empty(n)
 
     # Include initial state
-    Vb_ml, pH, rgb = env.history[0]
-    traj["Vb_ml"].append(Vb_ml)
-    traj["pH"].append(pH)
-    traj["color"].append(rgb)
-    traj["action"].append(-1)  # No action for initial state
-    traj["reward"].append(0.0)
+    Vb[0] = env.Vb_history[0]
+    pH_arr[0] = env.pH_history[0]
+    color[0] = env.rgb_history[0]
+    actions[0] = -1  # No action for initial state
+    rewards[0] = 0.0
 
+    i = 0
     for step in range(max_steps):
         if model is None:
             action = env.action_space.sample()
@@ -35,17 +49,25 @@ def run_episode(env, model=None, deterministic=True, max_steps=200):
 
         obs, reward, terminated, truncated, info = env.step(action)
 
-        Vb_ml, pH, rgb = env.history[-1]  # last recorded state
-        traj["Vb_ml"].append(Vb_ml)
-        traj["pH"].append(pH)
-        traj["color"].append(rgb)
-        traj["action"].append(int(action))
-        traj["reward"].append(float(reward))
+        i += 1
+        # last recorded state
+        Vb[i] = env.Vb_history[-1]
+        pH_arr[i] = env.pH_history[-1]
+        color[i] = env.rgb_history[-1]
+        actions[i] = action
+        rewards[i] = reward
 
         if terminated or truncated:
             break
 
-    return traj
+    n = i + 1
+    return {
+        "Vb_ml": Vb[:n],
+        "pH": pH_arr[:n],
+        "color": color[:n],
+        "action": actions[:n],
+        "reward": rewards[:n],
+    }
 
 
 def plot_titration_curves(random_traj, rl_traj, save_path=None):
@@ -79,7 +101,7 @@ def plot_titration_curves(random_traj, rl_traj, save_path=None):
 
     plt.tight_layout()
     if save_path:
-        plt.savefig(save_path, dpi=200, bbox_inches='tight')
+        plt.savefig(save_path, dpi=200)
         print(f"Saved figure to {save_path}")
     else:
         plt.show()
@@ -95,6 +117,7 @@ def main():
         max_steps=200,
         step_sizes_ml=(0.1, 0.2, 0.5, 1.0, 2.0, 3.0),
         max_burette_ml=50.0,
+        log_history=True,
     )
     print(f"Environment: Veq = {env.Veq_L*1000:.2f} mL, Initial pH = {env._get_pH():.2f}")
     print(f"Note: pH 7.0 occurs BEFORE equivalence (at equivalence, pH ≈ 8.73)")
@@ -103,15 +126,16 @@ def main():
     print("\nRunning random policy...")
     random_traj = run_episode(env, model=None)
     print(f"Random: {len(random_traj['Vb_ml'])} steps, Final pH = {random_traj['pH'][-1]:.2f}, "
-          f"Final Vb = {random_traj['Vb_ml'][-1]:.2f} mL, Total reward = {sum(random_traj['reward']):.2f}")
+          f"Final Vb = {random_traj['Vb_ml'][-1]:.2f} mL, Total reward = {random_traj['reward'].sum():.2f}")
 
     # Load trained model if available
     if model_path.exists():
         print(f"\nLoading trained model from {model_path}...")
-        model = PPO.load(model_path)
-        rl_traj = run_episode(env, model=model)
+        model = _load_ppo(str(model_path), model_path.stat().st_mtime)
+        with torch.inference_mode():
+            rl_traj = run_episode(env, model=model)
         print(f"Trained: {len(rl_traj['Vb_ml'])} steps, Final pH = {rl_traj['pH'][-1]:.2f}, "
-              f"Final Vb = {rl_traj['Vb_ml'][-1]:.2f} mL, Total reward = {sum(rl_traj['reward']):.2f}")
+              f"Final Vb = {rl_traj['Vb_ml'][-1]:.2f} mL, Total reward = {rl_traj['reward'].sum():.2f}")
     else:
         print(f"\nWarning: {model_path} not found. Using random for both.")
         model = None
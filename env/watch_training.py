@@ -9,8 +9,10 @@ import time
 from pathlib import Path
 
 import matplotlib.pyplot as plt
+from matplotlib.patches import Circle
 import numpy as np
 from stable_baselines3 import PPO
+import torch
 
 from src.titration_env import WeakAcidIndicatorEnv
 
@@ -27,122 +29,141 @@ def watch_episode(env, model=None, deterministic=True, delay=0.1, save_path=None
         save_path: Path to save final visualization
     """
     obs, _ = env.reset()
+    # Episode constants, read once rather than per step
+    Veq_ml = env.Veq_L * 1000
+    max_steps = env.max_steps
     
-    # Create figure for live updates
+    # Create figure for live updates. The static parts (axes labels, target
+    # and equivalence lines, legend, indicator circle) are drawn once; each
+    # step only updates the data of the artists below. Interactive mode goes
+    # on first: GUI backends only show figures created while it is on, and
+    # the loop below just draws and flushes events.
+    plt.ion()
     fig, axes = plt.subplots(1, 2, figsize=(14, 6))
-    plt.ion()  # Interactive mode
     
-    Vb_history = []
-    pH_history = []
-    color_history = []
-    reward_history = []
-    action_history = []
+    # Left plot: Titration curve
+    traj_line, = axes[0].plot([], [], 'o-', linewidth=2.5, markersize=8,
+                              color='steelblue', zorder=2, label='Trajectory')
+    start_marker = axes[0].scatter([], [], color='green', s=150, zorder=5,
+                                   label='Start', marker='s')
+    current_marker = axes[0].scatter([], [], color='red', s=200, zorder=5, label='Current',
+                                     marker='*', edgecolors='black', linewidths=2)
+    axes[0].axhline(7.0, color='gray', linestyle='--', linewidth=2, 
+                   alpha=0.7, label='Target pH 7.0', zorder=1)
+    axes[0].axvline(Veq_ml, color='orange', linestyle=':', 
+                   linewidth=2, alpha=0.7, label=f'Equivalence ({Veq_ml:.1f} mL)', zorder=1)
+    axes[0].set_xlabel('Base Volume Added (mL)', fontsize=12, fontweight='bold')
+    axes[0].set_ylabel('pH', fontsize=12, fontweight='bold')
+    axes[0].grid(True, alpha=0.3)
+    axes[0].legend(loc='best', fontsize=9)
+    axes[0].set_ylim(0, 14)
+    axes[0].set_xlim(-1, 60)
+    
+    # Right plot: Current state
+    circle = Circle((0.5, 0.5), 0.35, transform=axes[1].transAxes, 
+                    facecolor='white', edgecolor='black', linewidth=3)
+    axes[1].add_patch(circle)
+    info_box = axes[1].text(0.5, 0.15, '', transform=axes[1].transAxes,
+                            fontsize=10, ha='center', va='bottom',
+                            bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.9))
+    axes[1].set_xlim(0, 1)
+    axes[1].set_ylim(0, 1)
+    axes[1].axis('off')
+    axes[1].set_title('Indicator Color & Info', fontsize=14, fontweight='bold', pad=20)
+    
+    action_names = {0: 'Small', 1: 'Medium', 2: 'Large', 3: 'Stop'}
+    laid_out = False
+    
+    # Trajectory buffers; the env truncates after max_steps steps
+    Vb_history = np.empty(max_steps)
+    pH_history = np.empty(max_steps)
+    color_history = np.empty((max_steps, 3), dtype=np.float32)
+    reward_history = np.empty(max_steps)
+    action_history = np.empty(max_steps, dtype=np.int64)
     
     step = 0
     total_reward = 0.0
     
     while True:
+        t_start = time.perf_counter()
+        
         # Get action
         if model is None:
             action = env.action_space.sample()
         else:
             action, _ = model.predict(obs, deterministic=deterministic)
         
-        # Convert numpy array to int if needed (model.predict can return array)
-        if isinstance(action, np.ndarray):
-            action = int(action.item())
-        else:
-            action = int(action)
+        # Both sample() and model.predict return numpy values; one cast covers both
+        action = int(np.asarray(action).item())
         
         # Step environment
         obs, reward, terminated, truncated, info = env.step(action)
         
         # Record state
-        Vb_ml, pH, rgb = env.history[-1]
-        Vb_history.append(Vb_ml)
-        pH_history.append(pH)
-        color_history.append(rgb)
-        reward_history.append(reward)
-        action_history.append(action)
+        # Last recorded state, read straight from the env's history columns
+        Vb_ml = env.Vb_history[-1]
+        pH = env.pH_history[-1]
+        rgb = env.rgb_history[-1]
+        Vb_history[step] = Vb_ml
+        pH_history[step] = pH
+        color_history[step] = rgb
+        reward_history[step] = reward
+        action_history[step] = action
         total_reward += reward
         step += 1
         
         # Update visualization
-        axes[0].clear()
-        axes[1].clear()
-        
-        # Left plot: Titration curve
-        if len(Vb_history) > 1:
-            axes[0].plot(Vb_history, pH_history, 'o-', linewidth=2.5, 
-                       markersize=8, color='steelblue', zorder=2, label='Trajectory')
-        axes[0].scatter([Vb_history[0]], [pH_history[0]], color='green', 
-                       s=150, zorder=5, label='Start', marker='s')
-        axes[0].scatter([Vb_history[-1]], [pH_history[-1]], color='red', 
-                       s=200, zorder=5, label='Current', marker='*', edgecolors='black', linewidths=2)
-        axes[0].axhline(7.0, color='gray', linestyle='--', linewidth=2, 
-                       alpha=0.7, label='Target pH 7.0', zorder=1)
-        axes[0].axvline(env.Veq_L * 1000, color='orange', linestyle=':', 
-                       linewidth=2, alpha=0.7, label=f'Equivalence ({env.Veq_L*1000:.1f} mL)', zorder=1)
-        axes[0].set_xlabel('Base Volume Added (mL)', fontsize=12, fontweight='bold')
-        axes[0].set_ylabel('pH', fontsize=12, fontweight='bold')
+        traj_line.set_data(Vb_history[:step], pH_history[:step])
+        if step == 1:
+            start_marker.set_offsets([[Vb_ml, pH]])
+        current_marker.set_offsets([[Vb_ml, pH]])
         axes[0].set_title(f'Live Episode - Step {step} | Reward: {total_reward:.2f}', 
                          fontsize=14, fontweight='bold')
-        axes[0].grid(True, alpha=0.3)
-        axes[0].legend(loc='best', fontsize=9)
-        axes[0].set_ylim(0, 14)
-        axes[0].set_xlim(-1, max(Vb_history) * 1.1 if Vb_history else 60)
+        axes[0].set_xlim(-1, Vb_history[:step].max() * 1.1)
         
-        # Right plot: Current state
-        from matplotlib.patches import Circle
-        current_color = color_history[-1]
-        circle = Circle((0.5, 0.5), 0.35, transform=axes[1].transAxes, 
-                        facecolor=current_color, edgecolor='black', linewidth=3)
-        axes[1].add_patch(circle)
-        
-        action_names = {0: 'Small', 1: 'Medium', 2: 'Large', 3: 'Stop'}
-        info_text = f"""
+        circle.set_facecolor(rgb)
+        info_box.set_text(f"""
 Current State
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-pH: {pH_history[-1]:.2f}
-Base Added: {Vb_history[-1]:.2f} mL
-V/Veq: {Vb_history[-1] / (env.Veq_L * 1000):.2%}
-Step: {step}/{env.max_steps}
+pH: {pH:.2f}
+Base Added: {Vb_ml:.2f} mL
+V/Veq: {Vb_ml / Veq_ml:.2%}
+Step: {step}/{max_steps}
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 Action: {action} ({action_names.get(action, 'Unknown')})
 Reward: {reward:.3f}
 Total Reward: {total_reward:.2f}
-Distance to Target: {abs(pH_history[-1] - 7.0):.2f}
-        """.strip()
-        
-        axes[1].text(0.5, 0.15, info_text, transform=axes[1].transAxes,
-                    fontsize=10, ha='center', va='bottom',
-                    bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.9))
-        axes[1].set_xlim(0, 1)
-        axes[1].set_ylim(0, 1)
-        axes[1].axis('off')
-        axes[1].set_title('Indicator Color & Info', fontsize=14, fontweight='bold', pad=20)
+Distance to Target: {abs(pH - 7.0):.2f}
+        """.strip())
         
-        plt.tight_layout()
-        plt.draw()
-        plt.pause(0.01)
+        if not laid_out:
+            fig.tight_layout()
+            laid_out = True
+        # Title and x-limits change every step, so redraw the whole canvas
+        # and let the GUI process it instead of pausing in its event loop
+        fig.canvas.draw()
+        fig.canvas.flush_events()
         
         if terminated or truncated:
             break
         
-        time.sleep(delay)
+        # Only wait for whatever part of the delay rendering did not use up
+        remaining = delay - (time.perf_counter() - t_start)
+        if remaining > 0:
+            time.sleep(remaining)
     
     plt.ioff()
     
     if save_path:
-        plt.savefig(save_path, dpi=200, bbox_inches='tight')
+        fig.savefig(save_path, dpi=200)
         print(f"Saved episode visualization to {save_path}")
     
     return {
-        'Vb_ml': Vb_history,
-        'pH': pH_history,
-        'color': color_history,
-        'reward': reward_history,
-        'action': action_history,
+        'Vb_ml': Vb_history[:step],
+        'pH': pH_history[:step],
+        'color': color_history[:step],
+        'reward': reward_history[:step],
+        'action': action_history[:step],
         'total_reward': total_reward,
         'steps': step,
     }
@@ -169,6 +190,7 @@ def main():
         max_steps=200,
         step_sizes_ml=(0.1, 0.2, 0.5, 1.0, 2.0, 3.0),
         max_burette_ml=50.0,
+        log_history=True,
     )
     
     model = None
@@ -177,6 +199,9 @@ def main():
         if model_path.exists():
             print(f"Loading model from {model_path}...")
             model = PPO.load(model_path)
+            # Inference only: no autograd bookkeeping for the policy
+            model.policy.set_training_mode(False)
+            model.policy.requires_grad_(False)
         else:
             print(f"Warning: Model not found at {model_path}, using random policy")
     
@@ -191,13 +216,14 @@ def main():
         
         save_path = save_dir / f"episode_{episode+1:03d}.png" if args.save else None
         
-        traj = watch_episode(
-            env, 
-            model=model, 
-            deterministic=args.deterministic,
-            delay=args.delay,
-            save_path=save_path
-        )
+        with torch.inference_mode():
+            traj = watch_episode(
+                env, 
+                model=model, 
+                deterministic=args.deterministic,
+                delay=args.delay,
+                save_path=save_path
+            )
         
         print(f"\nEpisode Summary:")
         print(f"  Steps: {traj['steps']}")